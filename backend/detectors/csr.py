@@ -0,0 +1,60 @@
+import numpy as np
+import networkx as nx
+
+
+def build_csr(G: nx.DiGraph, predecessors: bool = False):
+    """
+    Compact int32 CSR adjacency for the whole graph — successor direction,
+    or predecessor direction with `predecessors=True`.
+
+    Node ids follow G's own node order and neighbours keep G's adjacency
+    order (G.succ / G.pred insertion order), so walks over the CSR visit
+    nodes in the same order as walks over G.
+
+    Returns (nodes, indptr, indices): `nodes[i]` is the label of id `i` and
+    the neighbours of id `i` are `indices[indptr[i]:indptr[i + 1]]`.
+    """
+    # G._succ / G._pred are DiGraph's raw node -> {neighbour: attrs} dicts
+    # (stable since networkx 2.0); reading them skips the view machinery of
+    # G.successors() / G.predecessors(). Both list nodes in the same order.
+    succ    = G._pred if predecessors else G._succ
+    nodes   = list(succ)
+    index   = {n: i for i, n in enumerate(nodes)}
+    lengths = np.fromiter((len(succ[n]) for n in nodes), dtype=np.int32, count=len(nodes))
+    indptr  = np.zeros(len(nodes) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.fromiter(
+        (index[nb] for n in nodes for nb in succ[n]), dtype=np.int32, count=int(indptr[-1])
+    )
+    return nodes, indptr, indices
+
+
+def csr_degrees(indptr, indices):
+    """(in_degree, out_degree) int arrays straight from the CSR arrays."""
+    out_deg = np.diff(indptr)
+    in_deg  = np.bincount(indices, minlength=len(out_deg))
+    return in_deg, out_deg
+
+
+def induced_csr(indptr, indices, ids):
+    """
+    CSR of the subgraph induced by `ids`, relabelled so `ids[i]` becomes
+    id `i`. Vectorized — no per-node Python loop.
+    """
+    ids    = np.asarray(ids, dtype=np.int64)
+    remap  = np.full(len(indptr) - 1, -1, dtype=np.int32)
+    remap[ids] = np.arange(len(ids), dtype=np.int32)
+
+    starts  = indptr[ids].astype(np.int64)
+    lengths = indptr[ids + 1] - starts
+    # Position of every successor slot of every selected row, row by row
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    slots   = offsets + np.arange(int(lengths.sum()))
+
+    succ = remap[indices[slots]]
+    rows = np.repeat(np.arange(len(ids)), lengths)
+    keep = succ >= 0
+
+    sub_indptr = np.zeros(len(ids) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows[keep], minlength=len(ids)), out=sub_indptr[1:])
+    return sub_indptr, succ[keep]
@@ -0,0 +1,23 @@
+"""
+Optional Numba acceleration for the detector kernels.
+
+Kernels are written against plain int arrays so they compile under
+``numba.njit``. If numba is not installed the decorator is a no-op and
+the same kernels run as ordinary Python.
+
+main.py runs each detector in its own worker process, so the kernels
+don't need ``nogil``: there is no other thread in the worker to overlap
+with. ``cache=True`` keeps the compiled code on disk, so new workers
+skip recompiling.
+"""
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # pragma: no cover - depends on the environment
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
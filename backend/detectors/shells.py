@@ -1,75 +1,107 @@
+import time
+from collections import deque
+from typing import Optional
+
+import numpy as np
 import networkx as nx
 import pandas as pd
 
+from .csr import build_csr, csr_degrees
+
 
-def detect_shell_networks(G: nx.DiGraph, df: pd.DataFrame):
+def detect_shell_networks(G: nx.DiGraph, df: pd.DataFrame, deadline: Optional[float] = None):
     """
     Shell network detection.
     Looks for chains: origin -> shell -> shell -> ... -> destination
     where intermediate accounts have very few total transactions (shells).
 
     Performance fixes vs original:
-    - Path stored as tuple (no list copying on stack push)
-    - Subchain deduplication uses a proper tuple-prefix set — O(1) lookup
-      instead of O(n) string startswith scan per chain
+    - Degrees and adjacency come from one int32 CSR build; the DFS walks
+      int ids and plain lists, labels are only looked up per emitted ring
+    - Path kept in one reusable buffer (no tuple built per stack push),
+      with an int bitmask for O(1) "already on path" checks
+    - Subchain deduplication marks each chain's direct prefix — one slice
+      per chain instead of an O(n) string startswith scan
     - Hard cap at 200 rings
+    - Optional `deadline` (time.monotonic() value), checked per source;
+      chains found before it passed are still deduplicated and returned
     """
     visited = set()
     HIGH_VOLUME_THRESHOLD = 50
     MAX_RINGS = 200
-
-    tx_count = {node: G.in_degree(node) + G.out_degree(node) for node in G.nodes()}
-
-    def is_shell(account):
-        return tx_count.get(account, 0) <= 3
-
-    def is_high_volume(account):
-        # OR logic: exclude if high volume in either direction (catches merchants)
-        return (G.in_degree(account) + G.out_degree(account)) > HIGH_VOLUME_THRESHOLD
-
-    # Only start from true origins: no incoming edges, not high volume
+    MAX_CHAIN_LEN = 6
+
+    # One CSR pass over G; the DFS below works on int ids and only maps
+    # back to account labels when a ring is emitted
+    nodes, indptr, indices = build_csr(G)
+    in_deg, out_deg = csr_degrees(indptr, indices)
+    tx_count = in_deg + out_deg
+
+    # Node classes are fixed for the call — precompute them once so the DFS
+    # does plain list indexing instead of a function call per neighbor
+    # Shells: accounts with very few total transactions
+    is_shell    = (tx_count <= 3).tolist()
+    # High volume in either direction (catches merchants)
+    high_volume = (tx_count > HIGH_VOLUME_THRESHOLD).tolist()
+    indptr      = indptr.tolist()
+    indices     = indices.tolist()
+
+    # Only start from true origins: no incoming edges, not high volume.
+    # A chain through a node with incoming edges is found from its origin
+    # anyway. The first hop is always an intermediate, so an origin with no
+    # shell successor can never start a chain and is skipped up front.
     source_candidates = [
-        n for n in G.nodes()
-        if G.in_degree(n) == 0 and not is_high_volume(n) and G.out_degree(n) > 0
+        n for n in np.flatnonzero((in_deg == 0) & (out_deg > 0)).tolist()
+        if not high_volume[n]
+        and any(is_shell[nb] for nb in indices[indptr[n]:indptr[n + 1]])
     ]
 
-    all_chains = []  # list of tuples
+    all_chains = []  # list of int-id tuples
 
     for source in source_candidates:
         if len(all_chains) >= MAX_RINGS:
             break
+        if deadline is not None and time.monotonic() > deadline:
+            break
 
-        # Use tuples for path — avoids list copy on every stack push
-        stack = [(source, (source,))]
+        # Stack frames are (node, depth, mask). The path itself lives in one
+        # reusable buffer: in LIFO order, popping a frame at `depth` leaves
+        # path[:depth] holding exactly its ancestors, so no per-push tuple
+        # is needed — a tuple is only built when a chain is recorded.
+        # Path membership is an int bitmask; bits are handed out per source
+        # as nodes are first seen, so masks stay small.
+        path  = [source] * MAX_CHAIN_LEN
+        bit   = {source: 1}
+        stack = deque([(source, 0, 1)])
         while stack:
-            current, path = stack.pop()
-
-            for neighbor in G.successors(current):
-                if neighbor in path or is_high_volume(neighbor):
+            current, depth, mask = stack.pop()
+            path[depth] = current
+            new_len     = depth + 2
+
+            for neighbor in indices[indptr[current]:indptr[current + 1]]:
+                nb_bit = bit.get(neighbor)
+                if nb_bit is None:
+                    nb_bit = bit[neighbor] = 1 << len(bit)
+                elif mask & nb_bit:
+                    continue
+                if high_volume[neighbor]:
                     continue
 
-                new_path = path + (neighbor,)
-
-                if len(new_path) >= 4:
-                    intermediates = new_path[1:-1]
-                    if all(is_shell(acc) for acc in intermediates):
-                        all_chains.append(new_path)
+                # Only shells are ever pushed, so every node after the source
+                # in `path` is a shell — the intermediates are valid by
+                # construction and need no re-check
+                if new_len >= 4:
+                    all_chains.append((*path[:depth + 1], neighbor))
 
-                if len(new_path) < 6 and is_shell(neighbor):
-                    stack.append((neighbor, new_path))
+                if new_len < MAX_CHAIN_LEN and is_shell[neighbor]:
+                    stack.append((neighbor, depth + 1, mask | nb_bit))
 
     # ── Maximal-chain deduplication in O(total_nodes) ──────────────────────
-    # Build a set of ALL prefixes that appear as strict subchains
-    # A chain is a subchain if any longer chain starts with it
-    all_chain_set = set(all_chains)
-
-    # For each chain, build all strict prefixes and mark them as non-maximal
-    non_maximal = set()
-    for chain in all_chains:
-        for prefix_len in range(4, len(chain)):          # prefixes of length 4..len-1
-            prefix = chain[:prefix_len]
-            if prefix in all_chain_set:
-                non_maximal.add(prefix)
+    # A chain is non-maximal if a longer chain extends it. The DFS records
+    # every shell-only path of length >= 4, so whenever a chain of length
+    # >= 5 was recorded its one-shorter prefix was recorded as well — the
+    # direct prefix is the only one that needs marking.
+    non_maximal = {chain[:-1] for chain in all_chains if len(chain) > 4}
 
     rings = []
     for chain in all_chains:
@@ -78,11 +110,12 @@ def detect_shell_networks(G: nx.DiGraph, df: pd.DataFrame):
         key = frozenset(chain)
         if key not in visited:
             visited.add(key)
+            chain = tuple(nodes[i] for i in chain)
             rings.append({
-                "members": list(chain),
+                "members": chain,
                 "pattern_type": "layered_shell_network",
                 "pattern_key": f"shell_chain_{len(chain) - 1}_hops",
-                "chain": list(chain),
+                "chain": chain,
                 "temporal": False,
             })
 
@@ -1,23 +1,63 @@
+import asyncio
 import logging
 import os
 import io
 import time
 import json
-import random
+import hashlib
 import concurrent.futures
-from collections import defaultdict
-from typing import Dict, List
-
+import multiprocessing
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import httpx
 import pandas as pd
+import numpy as np
 import networkx as nx
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from groq import Groq
+from fastapi.responses import JSONResponse, Response
+from groq import AsyncGroq
 from dotenv import load_dotenv
 
 from detectors import detect_cycles, detect_smurfing, detect_shell_networks
 
+# pyarrow's multi-threaded CSV reader when installed, pandas' C parser otherwise.
+# pyarrow doesn't reject invalid UTF-8 while parsing: it surfaces later, when
+# validate_csv decodes the columns, so those errors are caught there too.
+try:
+    import pyarrow
+    CSV_ENGINE        = "pyarrow"
+    CSV_DECODE_ERRORS = (UnicodeDecodeError, pyarrow.ArrowInvalid)
+except ImportError:
+    CSV_ENGINE        = "c"
+    CSV_DECODE_ERRORS = (UnicodeDecodeError,)
+
+# orjson serializes the Groq prompts and the /analyze response several times
+# faster than the stdlib json module when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_compact(obj) -> str:
+    """Compact JSON text — no indentation, which only adds prompt tokens."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def json_response(payload: dict) -> Response:
+    """JSON response body encoded by orjson when installed, JSONResponse otherwise."""
+    if orjson is not None:
+        body = orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        return Response(body, media_type="application/json")
+    return JSONResponse(payload)
+
 # ─── Logging (no secrets in logs) ────────────────────────────────────────────
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("rift")
@@ -31,7 +71,10 @@ if not GROQ_API_KEY:
 else:
     logger.info("GROQ_API_KEY loaded successfully")
 
-GROQ_MODEL = "llama-3.3-70b-versatile"
+GROQ_MODEL        = "llama-3.3-70b-versatile"
+GROQ_CHUNK_SIZE   = 20   # accounts per review call
+GROQ_CHUNK_CHARS  = 8000 # serialized profile JSON per review call (~2k tokens)
+GROQ_MAX_INFLIGHT = 5    # concurrent review calls per request
 
 # ─── Allowed origins ─────────────────────────────────────────────────────────
 # Add your Vercel frontend URL here
@@ -43,7 +86,21 @@ ALLOWED_ORIGINS = [
 ALLOWED_ORIGINS = [o for o in ALLOWED_ORIGINS if o]  # remove empty strings
 
 # ─── App ──────────────────────────────────────────────────────────────────────
-app = FastAPI(title="RIFT 2026 — Money Muling Detection Engine")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _groq_client, _detector_slots
+    yield
+    # Release the process-wide resources created lazily by requests, and
+    # clear them so a later lifespan in the same process (test clients,
+    # --reload) creates fresh ones instead of reusing closed ones
+    if _groq_client is not None:
+        await _groq_client.close()
+        _groq_client = None
+    reset_detector_pool()
+    _detector_slots = None
+
+
+app = FastAPI(title="RIFT 2026 — Money Muling Detection Engine", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -56,6 +113,17 @@ app.add_middleware(
 MAX_FILE_SIZE_BYTES = 20 * 1024 * 1024   # 20MB server-side limit
 MAX_ROWS            = 50_000             # prevent resource exhaustion
 MAX_ACCOUNT_ID_LEN  = 100
+TIMESTAMP_FORMAT    = "%Y-%m-%d %H:%M:%S"
+
+# Detector time budgets (seconds). A detector stops cooperatively at its
+# budget and returns the rings found so far; /analyze waits DETECTOR_GRACE
+# longer, so those partial results (up to one batch or hub of overshoot,
+# plus the transfer back) still arrive instead of timing out.
+CYCLE_TIMEOUT       = 15   # graphs of up to 1,000 accounts
+CYCLE_TIMEOUT_LARGE = 10
+SMURF_TIMEOUT       = 15
+SHELL_TIMEOUT       = 10
+DETECTOR_GRACE      = 2.0
 
 # ─── Scoring tables ───────────────────────────────────────────────────────────
 PATTERN_SCORES = {
@@ -77,6 +145,13 @@ PATTERN_SCORES = {
     "layered_shell_network": 75,
 }
 
+# Smurfing pattern key -> its direction ("fan_in" / "fan_out"), resolved once
+# instead of substring-probing every ring's key
+_BASE_PK_MAP = {
+    pk: ("fan_in" if "fan_in" in pk else "fan_out" if "fan_out" in pk else pk)
+    for pk in PATTERN_SCORES
+}
+
 RING_RISK_BASE = {
     "cycle_length_3":        95,
     "cycle_length_4":        92,
@@ -87,7 +162,10 @@ RING_RISK_BASE = {
 }
 
 
-def compute_suspicion_score(patterns: List[str]) -> float:
+@lru_cache(maxsize=1024)
+def compute_suspicion_score(patterns: Tuple[str, ...]) -> float:
+    # Pure function of the pattern tuple, and accounts only ever carry a
+    # handful of distinct combinations — each is scored once per process
     if not patterns:
         return 0.0
     base = max(PATTERN_SCORES.get(p, 50) for p in patterns)
@@ -99,22 +177,56 @@ def build_ring_id(index: int) -> str:
     return f"RING_{str(index + 1).zfill(3)}"
 
 
+def dedupe_rings(*ring_lists: List[dict]) -> List[dict]:
+    """
+    Rings from every list, in order, keeping the first ring for each
+    member set. Streams over the lists, with no concatenated copy.
+    """
+    seen    = set()
+    deduped = []
+    for rings in ring_lists:
+        for ring in rings:
+            key = frozenset(ring["members"])
+            if key not in seen:
+                seen.add(key)
+                deduped.append(ring)
+    return deduped
+
+
+@lru_cache(maxsize=64)
 def compute_ring_risk(pattern_type: str, is_temporal: bool) -> float:
+    # Only a handful of (pattern_type, temporal) pairs exist, so like
+    # compute_suspicion_score each is scored once per process
     base = RING_RISK_BASE.get(pattern_type, 70)
     if is_temporal:
         base = min(base + 5, 100)
     return round(float(base), 1)
 
 
-def build_graph(df: pd.DataFrame) -> nx.DiGraph:
+def build_graph(df: pd.DataFrame) -> Tuple[nx.DiGraph, np.ndarray, np.ndarray]:
+    """
+    Weighted transaction graph, plus its edges as (src, dst) arrays in the
+    graph's insertion order for callers that work on edges in bulk.
+    """
+    # Duplicate sender->receiver pairs collapse into one weighted edge.
+    # Accounts are factorized once and each pair becomes a single int64 key,
+    # so counting never hashes the string columns pairwise. factorize keeps
+    # first-seen order, so nodes and adjacency come out in the same order as
+    # a row-by-row build.
+    n = len(df)
+    codes, accounts = pd.factorize(
+        np.concatenate([df["sender_id"].to_numpy(), df["receiver_id"].to_numpy()])
+    )
+    k = len(accounts)
+    pair_codes, pairs = pd.factorize(codes[:n].astype(np.int64) * k + codes[n:])
+    weights = np.bincount(pair_codes)
+
+    src = accounts[pairs // k]
+    dst = accounts[pairs % k]
+
     G = nx.DiGraph()
-    for row in df[["sender_id", "receiver_id"]].itertuples(index=False):
-        s, r = row[0], row[1]
-        if G.has_edge(s, r):
-            G[s][r]["weight"] += 1
-        else:
-            G.add_edge(s, r, weight=1)
-    return G
+    G.add_weighted_edges_from(zip(src.tolist(), dst.tolist(), weights.tolist()))
+    return G, src, dst
 
 
 def validate_csv(df: pd.DataFrame) -> None:
@@ -130,6 +242,11 @@ def validate_csv(df: pd.DataFrame) -> None:
     if missing:
         raise HTTPException(status_code=400, detail=f"Missing required columns: {sorted(missing)}")
 
+    # At least one transaction. Checked explicitly: a header-only file parses
+    # to an empty frame whose column dtypes depend on the CSV engine
+    if df.empty:
+        raise HTTPException(status_code=400, detail="CSV contains no transactions")
+
     # Amount must be numeric and positive
     if not pd.api.types.is_numeric_dtype(df["amount"]):
         raise HTTPException(status_code=400, detail="Column 'amount' must be numeric")
@@ -138,9 +255,14 @@ def validate_csv(df: pd.DataFrame) -> None:
     if df["amount"].isna().any():
         raise HTTPException(status_code=400, detail="Column 'amount' contains null values")
 
-    # Timestamp must be parseable
+    # Timestamp must be parseable. The documented format is tried first so
+    # pandas never has to infer one; other formats pandas can read are
+    # still accepted through the inferring parse.
     try:
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        try:
+            df["timestamp"] = pd.to_datetime(df["timestamp"], format=TIMESTAMP_FORMAT)
+        except ValueError:
+            df["timestamp"] = pd.to_datetime(df["timestamp"])
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid timestamp format. Expected YYYY-MM-DD HH:MM:SS")
 
@@ -158,46 +280,158 @@ def validate_csv(df: pd.DataFrame) -> None:
         raise HTTPException(status_code=400, detail="More than 50% of transactions are self-transfers — invalid data")
 
 
+# ─── Detector workers ────────────────────────────────────────────────────────
+# The detectors are CPU-bound Python and hold the GIL, so they run in a
+# process pool to get real parallelism across cores. The pool is created on
+# first use and kept for the life of the server, so workers (and their
+# warmed-up numba kernels) are reused across requests.
+# Workers are sent a compact payload — the edge arrays and the three
+# columns smurfing reads — instead of a pickled nx.DiGraph.
+#
+# The pool is shared by every request, so a job is only submitted once one
+# of the DETECTOR_WORKERS slots is free, instead of queueing behind another
+# request's jobs. Its deadline is fixed at submit time and the parent waits
+# on the same clock (monotonic time is system-wide, so it holds across
+# processes): time spent waiting for a worker counts against both sides.
+#
+# Workers come from a forkserver (spawn where that is unavailable), never
+# from forking the server process itself, which already runs the event
+# loop and the Groq client's threads.
+
+DETECTOR_WORKERS = 3
+DETECTOR_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+_detector_pool  = None
+_detector_slots = None
+
+
+def get_detector_pool() -> concurrent.futures.ProcessPoolExecutor:
+    global _detector_pool
+    if _detector_pool is None:
+        _detector_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=DETECTOR_WORKERS, mp_context=DETECTOR_MP_CONTEXT
+        )
+    return _detector_pool
+
+
+def get_detector_slots() -> asyncio.Semaphore:
+    global _detector_slots
+    if _detector_slots is None:
+        _detector_slots = asyncio.Semaphore(DETECTOR_WORKERS)
+    return _detector_slots
+
+
+def reset_detector_pool() -> None:
+    """Drop a pool whose worker died so the next request starts a fresh one."""
+    global _detector_pool
+    if _detector_pool is not None:
+        _detector_pool.shutdown(wait=False, cancel_futures=True)
+        _detector_pool = None
+
+
+def submit_detector(name: str, *args):
+    """
+    Submit one detector job. A pool whose worker died between requests only
+    reports it at submit time, so a broken pool is replaced and the job
+    resubmitted once; returns None if that fails too.
+    """
+    for _ in range(2):
+        try:
+            return get_detector_pool().submit(run_detector, name, *args)
+        except BrokenProcessPool:
+            reset_detector_pool()
+    logger.warning(f"[WARN] {name} not run: detector pool is broken")
+    return None
+
+
+def run_detector(name: str, src: np.ndarray, dst: np.ndarray, frame: pd.DataFrame, deadline: float) -> list:
+    """
+    Worker entry point. Rebuilds G from the edge arrays — same edge order as
+    build_graph, so node order and adjacency order match the parent's G —
+    and runs one detector against `deadline` (a time.monotonic() value
+    fixed when the job was submitted).
+    """
+    G = nx.DiGraph()
+    G.add_edges_from(zip(src.tolist(), dst.tolist()))
+
+    t = time.time()
+    if name == "cycles":
+        result = detect_cycles(G, deadline=deadline)
+    elif name == "smurfing":
+        result = detect_smurfing(G, frame, deadline=deadline)
+    else:
+        result = detect_shell_networks(G, frame, deadline=deadline)
+    logger.info(f"[TIMING] {name + ':':<9} {time.time()-t:.2f}s  ({len(result)} rings)")
+    return result
+
+
 # ─── Groq AI review ───────────────────────────────────────────────────────────
 
-def build_account_profile(acc: dict, G: nx.DiGraph, df: pd.DataFrame) -> dict:
-    account_id = acc["account_id"]
-    in_deg     = G.in_degree(account_id)
-    out_deg    = G.out_degree(account_id)
-
-    incoming = df[df["receiver_id"] == account_id].sort_values("timestamp")
-
-    timing_cv = 0.0
-    avg_gap_hrs = 0.0
-    total_span_hrs = 0.0
-    if len(incoming) > 1:
-        gaps = incoming["timestamp"].diff().dropna().dt.total_seconds()
-        avg_gap_hrs    = round(float(gaps.mean()) / 3600, 2)
-        total_span_hrs = round(float((incoming["timestamp"].max() - incoming["timestamp"].min()).total_seconds()) / 3600, 2)
-        timing_cv      = round(float(gaps.std() / gaps.mean()), 4) if gaps.mean() > 0 else 0.0
-
-    amounts  = incoming["amount"].tolist()
-    amt_mean = round(float(sum(amounts) / len(amounts)), 2) if amounts else 0
-    amt_std  = round(float(pd.Series(amounts).std()), 2) if len(amounts) > 1 else 0
-
-    one_time_senders = sum(
-        1 for s in incoming["sender_id"]
-        if len(df[df["sender_id"] == s]) == 1
-    )
+def build_account_profiles(
+    accounts: List[dict], G: nx.DiGraph, df: pd.DataFrame, account_ids: np.ndarray
+) -> List[dict]:
+    """
+    Groq review profiles for `accounts`, built in one batch.
 
-    return {
-        "account_id":                   account_id,
-        "detected_patterns":            acc["detected_patterns"],
-        "suspicion_score":              acc["suspicion_score"],
-        "in_degree":                    in_deg,
-        "out_degree":                   out_deg,
-        "avg_gap_between_incoming_hrs": avg_gap_hrs,
-        "timing_regularity_cv":         timing_cv,
-        "total_incoming_timespan_hrs":  total_span_hrs,
-        "amount_mean":                  amt_mean,
-        "amount_std":                   amt_std,
-        "one_time_senders_pct":         round(one_time_senders / max(in_deg, 1) * 100, 1),
-    }
+    Everything shared is computed once up front as plain column arrays
+    (struct-of-arrays): per account only its incoming row positions are
+    sliced, with no pandas objects built per profile.
+    """
+    # df is time-sorted by /analyze, so each account's incoming rows (one
+    # groupby for all accounts) are already in time order
+    ts_ns         = df["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    amount        = df["amount"].to_numpy(dtype=np.float64)
+    senders       = df["sender_id"].to_numpy()
+    incoming_rows = df.groupby("receiver_id").indices
+    no_rows       = np.empty(0, dtype=np.intp)
+    # Blank timestamps are NaT, INT64_MIN in the int view: they are skipped
+    # for the timing stats (the old .diff().dropna() did the same)
+    nat           = np.iinfo(np.int64).min
+    # Sent-transaction count per account code
+    sender_counts = np.bincount(senders, minlength=len(account_ids))
+
+    profiles = []
+    for acc in accounts:
+        account_id = acc["account_id"]
+        rows       = incoming_rows.get(account_id, no_rows)
+        ts         = ts_ns[rows]
+        ts         = ts[ts != nat]
+        amounts    = amount[rows]
+        in_deg     = G.in_degree(account_id)
+        out_deg    = G.out_degree(account_id)
+
+        timing_cv = 0.0
+        avg_gap_hrs = 0.0
+        total_span_hrs = 0.0
+        if len(ts) > 1:
+            gaps     = np.diff(ts) / 1e9  # seconds
+            gap_mean = gaps.mean()
+            gap_std  = gaps.std(ddof=1) if len(gaps) > 1 else float("nan")
+            avg_gap_hrs    = round(float(gap_mean) / 3600, 2)
+            total_span_hrs = round(float(ts[-1] - ts[0]) / 1e9 / 3600, 2)
+            timing_cv      = round(float(gap_std / gap_mean), 4) if gap_mean > 0 else 0.0
+
+        amt_mean = round(float(amounts.mean()), 2) if len(amounts) else 0
+        amt_std  = round(float(amounts.std(ddof=1)), 2) if len(amounts) > 1 else 0
+
+        one_time_senders = int((sender_counts[senders[rows]] == 1).sum())
+
+        profiles.append({
+            "account_id":                   account_ids[account_id],
+            "detected_patterns":            acc["detected_patterns"],
+            "suspicion_score":              acc["suspicion_score"],
+            "in_degree":                    in_deg,
+            "out_degree":                   out_deg,
+            "avg_gap_between_incoming_hrs": avg_gap_hrs,
+            "timing_regularity_cv":         timing_cv,
+            "total_incoming_timespan_hrs":  total_span_hrs,
+            "amount_mean":                  amt_mean,
+            "amount_std":                   amt_std,
+            "one_time_senders_pct":         round(one_time_senders / max(in_deg, 1) * 100, 1),
+        })
+    return profiles
 
 
 def validate_groq_response(verdicts) -> bool:
@@ -214,28 +448,37 @@ def validate_groq_response(verdicts) -> bool:
     return True
 
 
-async def groq_review(flagged: List[dict], G: nx.DiGraph, df: pd.DataFrame) -> List[dict]:
-    """
-    Second-stage AI filter using Groq (Llama 3.3 70B).
-    Reviews only fan-in/fan-out hub accounts — cycles and leaves are skipped.
-    Cascade-removes leaf accounts when their hub is identified as a merchant.
-    """
-    if not GROQ_API_KEY:
-        logger.warning("[GROQ] No API key — skipping AI review")
-        return flagged
+# Verdicts are cached per profile: an account whose profile matches one
+# already reviewed (re-uploads, retries, overlapping flagged sets) reuses
+# that verdict instead of going back to the model.
+GROQ_CACHE_SIZE = 10_000
+_verdict_cache: "OrderedDict[str, dict]" = OrderedDict()
 
-    cycles    = [a for a in flagged if any("cycle" in p for p in a["detected_patterns"])]
-    leaves    = [a for a in flagged if not any("cycle" in p for p in a["detected_patterns"]) and any("leaf" in p for p in a["detected_patterns"])]
-    to_review = [a for a in flagged if not any("cycle" in p for p in a["detected_patterns"]) and not any("leaf" in p for p in a["detected_patterns"])]
 
-    if not to_review:
-        return flagged
+def profile_cache_key(profile: dict) -> str:
+    return hashlib.blake2b(json.dumps(profile, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def get_cached_verdict(key: str):
+    verdict = _verdict_cache.get(key)
+    if verdict is not None:
+        _verdict_cache.move_to_end(key)
+    return verdict
 
-    profiles = [build_account_profile(a, G, df) for a in to_review]
 
-    prompt = """You are a financial crime analyst reviewing accounts flagged by an automated money muling detection system.
+def cache_verdict(key: str, verdict: dict) -> None:
+    _verdict_cache[key] = verdict
+    _verdict_cache.move_to_end(key)
+    if len(_verdict_cache) > GROQ_CACHE_SIZE:
+        _verdict_cache.popitem(last=False)
 
-For each account below decide:
+
+# Static review instructions, sent as the system message of every call.
+# The per-chunk profiles go in a separate user message, so every request
+# shares an identical prefix the provider can cache.
+GROQ_INSTRUCTIONS = """You are a financial crime analyst reviewing accounts flagged by an automated money muling detection system.
+
+For each account in the user message decide:
 - KEEP   -> genuine money mule or high-risk account
 - REMOVE -> false positive (merchant, utility, payroll, automated payment processor)
 - REDUCE -> uncertain, keep but lower the risk score
@@ -250,46 +493,162 @@ Merchant signals (only apply to hub accounts):
 - amount_mean under 500 combined with regular timing = retail merchant
 - amount_mean over 500 with irregular timing and 100% one-time senders = real smurfing hub
 
-Respond with a JSON array only. Accounts to review:
-""" + json.dumps(profiles, indent=2)
+Respond with a JSON array only."""
 
-    try:
-        client   = Groq(api_key=GROQ_API_KEY)
-        response = client.chat.completions.create(
-            model=GROQ_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-            response_format={"type": "json_object"},
+
+async def request_verdicts(client: AsyncGroq, profiles: List[dict]):
+    """
+    One Groq call over `profiles`. Returns {account_id: verdict}, or None
+    if the response fails schema validation. Transport errors propagate.
+    """
+    response = await client.chat.completions.create(
+        model=GROQ_MODEL,
+        messages=[
+            {"role": "system", "content": GROQ_INSTRUCTIONS},
+            {"role": "user", "content": dumps_compact(profiles)},
+        ],
+        temperature=0.1,
+        response_format={"type": "json_object"},
+    )
+    raw    = response.choices[0].message.content
+    parsed = orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+    # Unwrap if Groq wraps in a dict key
+    if isinstance(parsed, dict):
+        verdicts = next(iter(parsed.values())) if len(parsed) == 1 else list(parsed.values())[0]
+    else:
+        verdicts = parsed
+
+    # Validate schema before using
+    if not validate_groq_response(verdicts):
+        return None
+
+    return {v["account_id"]: v for v in verdicts}
+
+
+# One AsyncGroq for the life of the process: its httpx connection pool keeps
+# TLS connections to the API open across requests instead of handshaking
+# again on every /analyze.
+_groq_client = None
+
+
+def get_groq_client() -> AsyncGroq:
+    global _groq_client
+    if _groq_client is None:
+        _groq_client = AsyncGroq(
+            api_key=GROQ_API_KEY,
+            http_client=httpx.AsyncClient(limits=httpx.Limits(max_connections=20)),
         )
-        raw    = response.choices[0].message.content
-        parsed = json.loads(raw)
+    return _groq_client
 
-        # Unwrap if Groq wraps in a dict key
-        if isinstance(parsed, dict):
-            verdicts = next(iter(parsed.values())) if len(parsed) == 1 else list(parsed.values())[0]
-        else:
-            verdicts = parsed
 
-        # Validate schema before using
-        if not validate_groq_response(verdicts):
-            logger.error("[GROQ] Invalid response schema — keeping all flagged accounts")
-            return flagged
+def chunk_profiles(profiles: List[dict]) -> List[List[dict]]:
+    """
+    Split `profiles` into review chunks of at most GROQ_CHUNK_SIZE accounts
+    and GROQ_CHUNK_CHARS of serialized JSON, whichever is reached first, so
+    accounts with long pattern lists can't grow one prompt without bound.
+    """
+    chunks, chunk, size = [], [], 0
+    for p in profiles:
+        n = len(dumps_compact(p))
+        if chunk and (len(chunk) >= GROQ_CHUNK_SIZE or size + n > GROQ_CHUNK_CHARS):
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(p)
+        size += n
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+async def review_profiles(profiles: List[dict]) -> Dict[str, dict]:
+    """
+    Review `profiles` in chunk_profiles() chunks, up to GROQ_MAX_INFLIGHT
+    calls at a time, and merge the verdicts. Smaller prompts come back
+    faster and overlap on the wire. A chunk that fails or returns a bad
+    schema yields no verdicts, so its accounts are kept as flagged.
+    """
+    inflight = asyncio.Semaphore(GROQ_MAX_INFLIGHT)
+
+    async def review_chunk(client, chunk):
+        async with inflight:
+            try:
+                verdicts = await request_verdicts(client, chunk)
+            except Exception:
+                logger.error(f"[GROQ] Review failed — keeping {len(chunk)} flagged accounts")
+                return {}
+        if verdicts is None:
+            logger.error(f"[GROQ] Invalid response schema — keeping {len(chunk)} flagged accounts")
+            return {}
+        return verdicts
+
+    chunks  = chunk_profiles(profiles)
+    client  = get_groq_client()
+    results = await asyncio.gather(*(review_chunk(client, c) for c in chunks))
+
+    merged = {}
+    for verdicts in results:
+        merged.update(verdicts)
+    return merged
+
+
+async def groq_review(flagged: List[dict], G: nx.DiGraph, df: pd.DataFrame, account_ids: np.ndarray) -> List[dict]:
+    """
+    Second-stage AI filter using Groq (Llama 3.3 70B).
+    Reviews only fan-in/fan-out hub accounts — cycles and leaves are skipped.
+    Cascade-removes leaf accounts when their hub is identified as a merchant.
+    Accounts are int codes; `account_ids` maps them to the ids Groq sees.
+    """
+    if not GROQ_API_KEY:
+        logger.warning("[GROQ] No API key — skipping AI review")
+        return flagged
 
-        v_map = {v["account_id"]: v for v in verdicts}
+    # One partition pass: each account's patterns are scanned once
+    cycles, leaves, to_review = [], [], []
+    for a in flagged:
+        patterns = a["detected_patterns"]
+        if any("cycle" in p for p in patterns):
+            cycles.append(a)
+        elif any("leaf" in p for p in patterns):
+            leaves.append(a)
+        else:
+            to_review.append(a)
 
-    except Exception as e:
-        logger.error(f"[GROQ] Review failed — keeping all flagged accounts")
+    if not to_review:
         return flagged
 
+    profiles = build_account_profiles(to_review, G, df, account_ids)
+
+    # Only profiles not reviewed before go to Groq
+    keys    = {p["account_id"]: profile_cache_key(p) for p in profiles}
+    v_map   = {}
+    pending = []
+    for p in profiles:
+        cached = get_cached_verdict(keys[p["account_id"]])
+        if cached is None:
+            pending.append(p)
+        else:
+            v_map[p["account_id"]] = cached
+    if v_map:
+        logger.info(f"[GROQ] {len(v_map)}/{len(profiles)} verdicts served from cache")
+
+    if pending:
+        fresh = await review_profiles(pending)
+        for label, v in fresh.items():
+            if label in keys:
+                cache_verdict(keys[label], v)
+                v_map[label] = v
+
     removed_hubs = set()
     reviewed     = []
 
     for acc in to_review:
-        v = v_map.get(acc["account_id"])
+        label = account_ids[acc["account_id"]]
+        v = v_map.get(label)
         if not v or v["verdict"] == "KEEP":
             reviewed.append(acc)
         elif v["verdict"] == "REMOVE":
-            logger.info(f"[GROQ] Removed  {acc['account_id']}: {v.get('reason', '')}")
+            logger.info(f"[GROQ] Removed  {label}: {v.get('reason', '')}")
             removed_hubs.add(acc["account_id"])
         elif v["verdict"] == "REDUCE":
             adj = v.get("score_adjustment", -20)
@@ -299,7 +658,7 @@ Respond with a JSON array only. Accounts to review:
             acc["suspicion_score"] = max(round(acc["suspicion_score"] + adj, 1), 10)
             acc["ai_note"]         = str(v.get("reason", ""))[:200]  # cap length
             reviewed.append(acc)
-            logger.info(f"[GROQ] Reduced  {acc['account_id']} by {adj}")
+            logger.info(f"[GROQ] Reduced  {label} by {adj}")
         else:
             reviewed.append(acc)
 
@@ -328,71 +687,92 @@ async def analyze(request: Request, file: UploadFile = File(...)):
     start = time.time()
 
     # ── Server-side file size check ───────────────────────────────────────
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE_BYTES:
+    # The upload is already spooled by Starlette; measure it in place
+    # instead of reading it into memory
+    upload = file.file
+    upload.seek(0, io.SEEK_END)
+    size = upload.tell()
+    upload.seek(0)
+    if size > MAX_FILE_SIZE_BYTES:
         raise HTTPException(status_code=400, detail="File too large. Maximum size is 20MB.")
 
     # ── Parse CSV ─────────────────────────────────────────────────────────
     try:
-        df = pd.read_csv(io.StringIO(content.decode("utf-8")))
+        # The parser streams straight from the spooled file: no bytes copy,
+        # no Python-side decode + StringIO copy
+        df = pd.read_csv(upload, encoding="utf-8", engine=CSV_ENGINE)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid CSV file. Please check the format.")
 
     # ── Validate input ────────────────────────────────────────────────────
-    validate_csv(df)
+    try:
+        validate_csv(df)
+    except CSV_DECODE_ERRORS:
+        raise HTTPException(status_code=400, detail="Invalid CSV file. Please check the format.")
 
-    df["sender_id"]   = df["sender_id"].astype(str)
-    df["receiver_id"] = df["receiver_id"].astype(str)
+    # Account ids become int32 codes once: the graph, detectors, sets and
+    # dicts below all hash small ints instead of strings. sort=True keeps
+    # code order == id order, so "smallest account" logic is unchanged.
+    # account_ids maps codes back to ids only when the response is built.
+    n = len(df)
+    codes, account_ids = pd.factorize(
+        np.concatenate([df["sender_id"].to_numpy(), df["receiver_id"].to_numpy()]), sort=True
+    )
+    df["sender_id"]   = codes[:n].astype(np.int32)
+    df["receiver_id"] = codes[n:].astype(np.int32)
 
-    G              = build_graph(df)
+    G, src, dst    = build_graph(df)
+    # Rows are kept in time order from here on (stable, so ties stay in file
+    # order): per-account slices of df come out already sorted by timestamp
+    df             = df.sort_values("timestamp", kind="mergesort", ignore_index=True)
     total_accounts = G.number_of_nodes()
     shell_skipped  = total_accounts > 2000
-    cycle_timeout  = 15 if total_accounts <= 1000 else 10
+    cycle_timeout  = CYCLE_TIMEOUT if total_accounts <= 1000 else CYCLE_TIMEOUT_LARGE
 
     # ── Run detectors concurrently ────────────────────────────────────────
-    def run_cycles():
-        t = time.time(); result = detect_cycles(G)
-        logger.info(f"[TIMING] cycles:   {time.time()-t:.2f}s  ({len(result)} rings)")
-        return result
-
-    def run_smurfs():
-        t = time.time(); result = detect_smurfing(G, df)
-        logger.info(f"[TIMING] smurfing: {time.time()-t:.2f}s  ({len(result)} rings)")
-        return result
-
-    def run_shells():
-        t = time.time(); result = detect_shell_networks(G, df)
-        logger.info(f"[TIMING] shells:   {time.time()-t:.2f}s  ({len(result)} rings)")
-        return result
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        f_cycles = executor.submit(run_cycles)
-        f_smurfs = executor.submit(run_smurfs)
-        f_shells = executor.submit(run_shells) if not shell_skipped else None
-
-        try:    cycle_rings = f_cycles.result(timeout=cycle_timeout)
-        except Exception as e:
-            logger.warning(f"[WARN] cycles failed: {e}"); cycle_rings = []
-
-        try:    smurf_rings = f_smurfs.result(timeout=15)
-        except Exception as e:
-            logger.warning(f"[WARN] smurfing failed: {e}"); smurf_rings = []
-
-        try:    shell_rings = f_shells.result(timeout=10) if f_shells else []
-        except Exception as e:
-            logger.warning(f"[WARN] shells failed: {e}"); shell_rings = []
+    # The pool futures are awaited, not joined, so the event loop keeps
+    # serving other requests while the detectors run. Each job waits for a
+    # free worker slot, then is submitted with a cooperative deadline of
+    # `timeout` from that moment, so it stops on its own and returns what it
+    # found; the wait runs DETECTOR_GRACE past the same deadline so that
+    # partial result is kept. A timeout only stops waiting, the worker keeps
+    # running.
+    frame = df[["sender_id", "receiver_id", "timestamp"]]
+
+    async def run(name, frame, timeout):
+        async with get_detector_slots():
+            future = submit_detector(name, src, dst, frame, time.monotonic() + timeout)
+            if future is None:
+                return []
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), timeout + DETECTOR_GRACE)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"[WARN] {name} timed out after {timeout + DETECTOR_GRACE}s — its rings are dropped"
+                )
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    reset_detector_pool()
+                logger.warning(f"[WARN] {name} failed: {e}")
+            return []
+
+    async def skipped():
+        return []
+
+    cycle_rings, smurf_rings, shell_rings = await asyncio.gather(
+        run("cycles",   None,  cycle_timeout),
+        run("smurfing", frame, SMURF_TIMEOUT),
+        run("shells",   None,  SHELL_TIMEOUT) if not shell_skipped else skipped(),
+    )
 
     # ── Deduplicate rings ─────────────────────────────────────────────────
-    seen_keys     = set()
-    deduped_rings = []
-    for ring in cycle_rings + smurf_rings + shell_rings:
-        key = frozenset(ring["members"])
-        if key not in seen_keys:
-            seen_keys.add(key); deduped_rings.append(ring)
+    deduped_rings = dedupe_rings(cycle_rings, smurf_rings, shell_rings)
 
     # ── Build account → patterns and ring membership ──────────────────────
-    account_patterns: Dict[str, List[str]] = defaultdict(list)
-    account_rings:    Dict[str, List[str]] = defaultdict(list)
+    # Keyed by account code (ids are mapped back when the response is built).
+    # Patterns per account as dict keys: O(1) dedupe, insertion order kept
+    account_patterns: Dict[int, Dict[str, None]] = defaultdict(dict)
+    account_rings:    Dict[int, List[str]] = defaultdict(list)
     fraud_rings = []
 
     for idx, ring in enumerate(deduped_rings):
@@ -404,29 +784,34 @@ async def analyze(request: Request, file: UploadFile = File(...)):
 
         fraud_rings.append({
             "ring_id":         ring_id,
-            "member_accounts": ring["members"],
+            "member_accounts": account_ids[list(ring["members"])].tolist(),
             "pattern_type":    pt,
             "risk_score":      risk,
         })
 
-        hub      = ring.get("hub")
-        is_smurf = pt in ("smurfing_fan_in", "smurfing_fan_out")
-        t_suffix = "_temporal" if is_temporal else ""
-        base_pk  = "fan_in" if "fan_in" in pk else ("fan_out" if "fan_out" in pk else pk)
+        # Member pattern keys are fixed per ring: smurfing rings split into
+        # hub/leaf keys, every other ring tags all members with its own key
+        hub = ring.get("hub")
+        if pt in ("smurfing_fan_in", "smurfing_fan_out"):
+            base_pk  = _BASE_PK_MAP.get(pk, pk)
+            t_suffix = "_temporal" if is_temporal else ""
+            hub_pk   = f"{base_pk}_hub{t_suffix}"
+            leaf_pk  = f"{base_pk}_leaf{t_suffix}"
+        else:
+            hub_pk = leaf_pk = pk
 
         for acc in ring["members"]:
-            acc_pk = f"{base_pk}_{'hub' if acc == hub else 'leaf'}{t_suffix}" if is_smurf else pk
-            if acc_pk not in account_patterns[acc]:
-                account_patterns[acc].append(acc_pk)
+            account_patterns[acc][hub_pk if acc == hub else leaf_pk] = None
             account_rings[acc].append(ring_id)
 
     suspicious_accounts = []
     for acc, patterns in account_patterns.items():
+        patterns = tuple(patterns)
         score = compute_suspicion_score(patterns)
         suspicious_accounts.append({
             "account_id":        acc,
             "suspicion_score":   score,
-            "detected_patterns": patterns,
+            "detected_patterns": list(patterns),
             "ring_id":           account_rings[acc][0],
             "all_ring_ids":      account_rings[acc],
         })
@@ -435,53 +820,72 @@ async def analyze(request: Request, file: UploadFile = File(...)):
 
     # ── Groq second-stage review ──────────────────────────────────────────
     t_ai = time.time()
-    suspicious_accounts = await groq_review(suspicious_accounts, G, df)
+    suspicious_accounts = await groq_review(suspicious_accounts, G, df, account_ids)
     suspicious_accounts.sort(key=lambda x: x["suspicion_score"], reverse=True)
     logger.info(f"[TIMING] groq:     {time.time()-t_ai:.2f}s")
 
-    suspicious_set = {a["account_id"] for a in suspicious_accounts}
+    # One Python pass over the final list. The suspicious set is a live view
+    # of score_map's keys: O(1) membership and set operators, no copy
+    score_map      = {a["account_id"]: a["suspicion_score"] for a in suspicious_accounts}
+    suspicious_set = score_map.keys()
 
     # ── Graph visualization ───────────────────────────────────────────────
     # Two node sets are sent to the frontend:
     # - "focused" view: suspicious nodes + 1-hop neighbors (default)
     # - "full" view: all nodes capped at MAX_NODES (toggled by user)
     MAX_NODES = 500
-    score_map = {a["account_id"]: a["suspicion_score"] for a in suspicious_accounts}
+
+    # Boolean lookup by account code (every code is a node of G)
+    is_suspicious = np.zeros(len(account_ids), dtype=bool)
+    is_suspicious[list(suspicious_set)] = True
+
+    # Capped views sample only the k ids they keep, instead of shuffling
+    # every candidate
+    rng = np.random.default_rng()
+
+    def sample(candidates: np.ndarray, k: int) -> List[int]:
+        k = max(k, 0)
+        if len(candidates) <= k:
+            return candidates.tolist()
+        return candidates[rng.choice(len(candidates), size=k, replace=False)].tolist()
 
     # Focused: suspicious + 1-hop neighbors
     focused_keep = set(suspicious_set)
+    # Raw adjacency dicts (see build_csr): set.update iterates their keys
+    # directly, with no neighbour lists built per node
+    pred, succ = G._pred, G._succ
     for n in suspicious_set:
-        for nb in list(G.predecessors(n)) + list(G.successors(n)):
-            focused_keep.add(nb)
+        focused_keep.update(pred[n])
+        focused_keep.update(succ[n])
     if len(focused_keep) > MAX_NODES:
-        neighbors = list(focused_keep - suspicious_set)
-        random.shuffle(neighbors)
-        focused_keep = suspicious_set | set(neighbors[:MAX_NODES - len(suspicious_set)])
+        neighbors    = np.fromiter(focused_keep - suspicious_set, dtype=np.int64)
+        focused_keep = suspicious_set | set(sample(neighbors, MAX_NODES - len(suspicious_set)))
 
     # Full: all nodes capped at MAX_NODES (suspicious first, then random sample)
     if G.number_of_nodes() <= MAX_NODES:
         full_keep = set(G.nodes())
     else:
-        others = [n for n in G.nodes() if n not in suspicious_set]
-        random.shuffle(others)
-        full_keep = suspicious_set | set(others[:MAX_NODES - len(suspicious_set)])
+        others    = np.flatnonzero(~is_suspicious)
+        full_keep = suspicious_set | set(sample(others, MAX_NODES - len(suspicious_set)))
 
     graph_capped = G.number_of_nodes() > MAX_NODES
 
+    # Node/edge lists straight from the edge arrays: boolean lookups by
+    # account code replace a networkx subgraph view per call
     def build_graph_data(keep_set, edges_filter_suspicious=False):
-        sub = G.subgraph(keep_set)
         nodes = [
-            {"id": n, "suspicious": n in suspicious_set, "suspicion_score": score_map.get(n, 0)}
-            for n in sub.nodes()
+            {"id": account_ids[n], "suspicious": n in suspicious_set, "suspicion_score": score_map.get(n, 0)}
+            for n in keep_set
         ]
+        keep = np.zeros(len(account_ids), dtype=bool)
+        keep[list(keep_set)] = True
+        mask = keep[src] & keep[dst]
         if edges_filter_suspicious:
-            edges = [
-                {"source": u, "target": v}
-                for u, v in sub.edges()
-                if u in suspicious_set or v in suspicious_set
-            ]
-        else:
-            edges = [{"source": u, "target": v} for u, v in sub.edges()]
+            mask &= is_suspicious[src] | is_suspicious[dst]
+        edges = [
+            {"source": u, "target": v}
+            for u, v in zip(account_ids[src[mask]].tolist(), account_ids[dst[mask]].tolist())
+        ]
         return nodes, edges
 
     focused_nodes, focused_edges = build_graph_data(focused_keep, edges_filter_suspicious=True)
@@ -490,10 +894,13 @@ async def analyze(request: Request, file: UploadFile = File(...)):
     graph_nodes = focused_nodes
     graph_edges = focused_edges
 
+    for acc in suspicious_accounts:
+        acc["account_id"] = account_ids[acc["account_id"]]
+
     elapsed = round(time.time() - start, 2)
     logger.info(f"[TIMING] total:    {elapsed}s")
 
-    return JSONResponse({
+    return json_response({
         "suspicious_accounts": suspicious_accounts,
         "fraud_rings":         fraud_rings,
         "summary": {
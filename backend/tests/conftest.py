@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# main.py and the detectors package are imported from backend/, the way
+# uvicorn runs them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# No Groq review in tests: every flagged account is kept as detected
+os.environ["GROQ_API_KEY"] = ""
+
+import main  # noqa: E402
+
+HEADER = "transaction_id,sender_id,receiver_id,amount,timestamp\n"
+
+
+def make_csv(rows) -> bytes:
+    """CSV upload body from (sender, receiver, amount, timestamp) tuples."""
+    lines = [f"T{i},{s},{r},{a},{t}\n" for i, (s, r, a, t) in enumerate(rows, 1)]
+    return (HEADER + "".join(lines)).encode()
+
+
+# A -> B -> C -> A: one 3-cycle, nothing else
+CYCLE_ROWS = [
+    ("A", "B", 500.0, "2025-01-01 10:00:00"),
+    ("B", "C", 490.0, "2025-01-01 11:00:00"),
+    ("C", "A", 480.0, "2025-01-01 12:00:00"),
+]
+
+
+def post_csv(client, body: bytes):
+    return client.post("/analyze", files={"file": ("upload.csv", body, "text/csv")})
+
+
+@pytest.fixture(autouse=True)
+def no_groq(monkeypatch):
+    monkeypatch.setattr(main, "GROQ_API_KEY", None)
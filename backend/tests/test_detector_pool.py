@@ -0,0 +1,105 @@
+import concurrent.futures
+import os
+import signal
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from conftest import CYCLE_ROWS, make_csv, post_csv
+
+
+def no_rings(*args, **kwargs):
+    return []
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    """
+    Run detector jobs on threads, so detectors patched in this process are
+    the ones that run.
+    """
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=main.DETECTOR_WORKERS)
+    monkeypatch.setattr(main, "get_detector_pool", lambda: pool)
+    monkeypatch.setattr(main, "detect_smurfing", no_rings)
+    monkeypatch.setattr(main, "detect_shell_networks", no_rings)
+    yield pool
+    pool.shutdown(wait=True, cancel_futures=True)
+
+
+def test_partial_rings_from_a_slow_detector_reach_the_response(thread_pool, monkeypatch):
+    def slow_cycles(G, deadline=None):
+        # Overshoots its deadline the way a batch in flight does, then
+        # returns what it found so far
+        time.sleep(max(deadline - time.monotonic(), 0) + 0.2)
+        return [{"members": (0, 1, 2), "pattern_type": "cycle_length_3", "pattern_key": "cycle_length_3"}]
+
+    monkeypatch.setattr(main, "detect_cycles", slow_cycles)
+    monkeypatch.setattr(main, "CYCLE_TIMEOUT", 0.3)
+    monkeypatch.setattr(main, "DETECTOR_GRACE", 1.0)
+
+    with TestClient(main.app) as client:
+        r = post_csv(client, make_csv(CYCLE_ROWS))
+
+    assert r.status_code == 200
+    assert [ring["member_accounts"] for ring in r.json()["fraud_rings"]] == [["A", "B", "C"]]
+
+
+def test_detector_past_its_grace_is_dropped_with_a_warning(thread_pool, monkeypatch, caplog):
+    def stuck_cycles(G, deadline=None):
+        time.sleep(1.0)
+        return [{"members": (0, 1, 2), "pattern_type": "cycle_length_3", "pattern_key": "cycle_length_3"}]
+
+    monkeypatch.setattr(main, "detect_cycles", stuck_cycles)
+    monkeypatch.setattr(main, "CYCLE_TIMEOUT", 0.1)
+    monkeypatch.setattr(main, "DETECTOR_GRACE", 0.1)
+
+    with TestClient(main.app) as client:
+        r = post_csv(client, make_csv(CYCLE_ROWS))
+
+    assert r.status_code == 200
+    assert r.json()["fraud_rings"] == []
+    assert "cycles timed out" in caplog.text
+
+
+# ── Real process pool ─────────────────────────────────────────────────────────
+
+def test_pool_workers_do_not_fork_the_server():
+    assert main.DETECTOR_MP_CONTEXT.get_start_method() in ("forkserver", "spawn")
+
+
+def test_shutdown_resets_the_pool_so_a_second_lifespan_works():
+    with TestClient(main.app) as client:
+        assert post_csv(client, make_csv(CYCLE_ROWS)).status_code == 200
+        assert main._detector_pool is not None
+
+    assert main._detector_pool is None
+    assert main._detector_slots is None
+    assert main._groq_client is None
+
+    with TestClient(main.app) as client:
+        r = post_csv(client, make_csv(CYCLE_ROWS))
+    assert r.status_code == 200
+    assert [ring["member_accounts"] for ring in r.json()["fraud_rings"]] == [["A", "B", "C"]]
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs SIGKILL")
+def test_pool_broken_between_requests_is_replaced():
+    with TestClient(main.app) as client:
+        assert post_csv(client, make_csv(CYCLE_ROWS)).status_code == 200
+
+        # Kill an idle worker, the way an OOM kill would, and wait for the
+        # pool to notice
+        pool = main._detector_pool
+        os.kill(next(iter(pool._processes)), signal.SIGKILL)
+        for _ in range(50):
+            if pool._broken:
+                break
+            time.sleep(0.1)
+        assert pool._broken
+
+        r = post_csv(client, make_csv(CYCLE_ROWS))
+        assert r.status_code == 200
+        assert [ring["member_accounts"] for ring in r.json()["fraud_rings"]] == [["A", "B", "C"]]
+        assert main._detector_pool is not pool
@@ -0,0 +1,29 @@
+import warnings
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+import main
+
+
+def test_blank_timestamps_are_skipped_in_timing_stats():
+    # Account codes: 0 = hub, 1..3 = senders. df is time-sorted the way
+    # /analyze hands it over, with NaT last.
+    df = pd.DataFrame({
+        "sender_id":   np.array([1, 2, 3, 1], dtype=np.int32),
+        "receiver_id": np.array([0, 0, 0, 0], dtype=np.int32),
+        "amount":      [100.0, 200.0, 300.0, 400.0],
+        "timestamp":   pd.to_datetime(["2025-01-01 00:00", "2025-01-01 01:00", "2025-01-01 03:00", None]),
+    })
+    G = nx.DiGraph()
+    G.add_edges_from(zip(df["sender_id"].tolist(), df["receiver_id"].tolist()))
+    account = {"account_id": 0, "detected_patterns": ["fan_in_hub_temporal"], "suspicion_score": 95.0}
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        [profile] = main.build_account_profiles([account], G, df, np.array(["HUB", "A", "B", "C"], dtype=object))
+
+    assert profile["avg_gap_between_incoming_hrs"] == 1.5
+    assert profile["total_incoming_timespan_hrs"] == 3.0
+    assert profile["amount_mean"] == 250.0
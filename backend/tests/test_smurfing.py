@@ -0,0 +1,64 @@
+import warnings
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from detectors import detect_smurfing
+
+
+def fan_in_frame(senders, hub="HUB", start="2025-01-01 00:00:00"):
+    """One transaction from each sender to `hub`, an hour apart, in file order."""
+    t0 = pd.Timestamp(start)
+    return pd.DataFrame({
+        "sender_id":   senders,
+        "receiver_id": [hub] * len(senders),
+        "timestamp":   [t0 + pd.Timedelta(hours=i) for i in range(len(senders))],
+    })
+
+
+def graph_of(df):
+    G = nx.DiGraph()
+    G.add_edges_from(zip(df["sender_id"], df["receiver_id"]))
+    return G
+
+
+def test_fan_in_members_keep_predecessor_order():
+    # A chain between the senders, a month earlier, adds them to G in the
+    # reverse of the order they later pay the hub in: node order and
+    # G.predecessors() order differ, and members must follow the latter
+    senders = [f"S{i:02d}" for i in (7, 3, 11, 0, 9, 1, 5, 10, 2, 8, 4, 6)]
+    chain   = senders[::-1]
+    earlier = pd.DataFrame({
+        "sender_id":   chain[:-1],
+        "receiver_id": chain[1:],
+        "timestamp":   [pd.Timestamp("2024-12-01")] * (len(chain) - 1),
+    })
+    df = pd.concat([earlier, fan_in_frame(senders)], ignore_index=True)
+    G  = graph_of(df)
+    assert list(G)[:len(chain)] == chain
+
+    rings = detect_smurfing(G, df)
+
+    assert [r["pattern_type"] for r in rings] == ["smurfing_fan_in"]
+    assert rings[0]["members"] == (*G.predecessors("HUB"), "HUB")
+    assert rings[0]["members"][:-1] == tuple(senders)
+
+
+def test_blank_timestamps_are_left_out_of_the_windows():
+    senders = [f"S{i:02d}" for i in range(12)]
+    df = fan_in_frame(senders)
+    # Two extra payments with blank timestamps (NaT after validate_csv)
+    blank = pd.DataFrame({
+        "sender_id":   ["S00", "S01"],
+        "receiver_id": ["HUB", "HUB"],
+        "timestamp":   [pd.NaT, pd.NaT],
+    })
+    df = pd.concat([df, blank], ignore_index=True)
+    G  = graph_of(df)
+
+    with np.errstate(all="raise"), warnings.catch_warnings():
+        warnings.simplefilter("error")
+        rings = detect_smurfing(G, df)
+
+    assert [r["hub"] for r in rings] == ["HUB"]
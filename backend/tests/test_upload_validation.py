@@ -0,0 +1,27 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from conftest import CYCLE_ROWS, HEADER, make_csv, post_csv
+
+ENGINES = ["c"] + (["pyarrow"] if main.CSV_ENGINE == "pyarrow" else [])
+
+
+@pytest.fixture(params=ENGINES)
+def client(request, monkeypatch):
+    monkeypatch.setattr(main, "CSV_ENGINE", request.param)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_header_only_upload_is_rejected(client):
+    r = post_csv(client, HEADER.encode())
+    assert r.status_code == 400
+    assert r.json()["detail"] == "CSV contains no transactions"
+
+
+def test_invalid_utf8_upload_is_rejected(client):
+    body = make_csv(CYCLE_ROWS).replace(b"A,B", b"A\xff\xfe,B", 1)
+    r = post_csv(client, body)
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid CSV file. Please check the format."